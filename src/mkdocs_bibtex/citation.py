@@ -1,15 +1,22 @@
 from dataclasses import dataclass
+from functools import cached_property
 from typing import List
 import re
+import sys
+
+from mkdocs_bibtex.utils import log
 
 
 CITATION_REGEX = re.compile(r"(?:(?P<prefix>[^@;]*?)\s*)?@(?P<key>[\w-]+)(?:,\s*(?P<suffix>[^;]+))?")
-CITATION_BLOCK_REGEX = re.compile(r"\[(.*?)\]")
+CITATION_BLOCK_REGEX = re.compile(r"\[([^\]\n]*@[^\]\n]*)\]")
 EMAIL_REGEX = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+# A citation or an email at the start of each ";" separated part of a citation block
+CITATION_PART_REGEX = re.compile(rf"(?:^|(?<=;))(?:(?P<email>{EMAIL_REGEX.pattern})|{CITATION_REGEX.pattern})")
 INLINE_REFERENCE_REGEX = re.compile(r"(?<!\[)@(?P<key>[\w:-]+)(?![\w\s]*\])")
+REFERENCE_KEY_REGEX = re.compile(r"@(?P<key>[\w:-]+)")
 
 
-@dataclass
+@dataclass(frozen=True)
 class Citation:
     """Represents a citation in raw markdown without formatting"""
 
@@ -18,7 +25,11 @@ class Citation:
     suffix: str = ""
 
     def __str__(self) -> str:
-        """String representation of the citation"""
+        return self._str
+
+    @cached_property
+    def _str(self) -> str:
+        """String representation of the citation, built once as citations are immutable"""
         parts = []
         if self.prefix:
             parts.append(self.prefix)
@@ -30,27 +41,28 @@ class Citation:
     @classmethod
     def from_markdown(cls, markdown: str) -> List["Citation"]:
         """Extracts citations from a markdown string"""
-        citations = []
-
-        pos_citations = markdown.split(";")
-        pos_citations = [citation for citation in pos_citations if EMAIL_REGEX.match(citation) is None]
-
-        for citation in pos_citations:
-            match = CITATION_REGEX.match(citation)
-
-            if match:
-                result = {group: (match.group(group) or "") for group in ["prefix", "key", "suffix"]}
-                citations.append(Citation(prefix=result["prefix"], key=result["key"], suffix=result["suffix"]))
-        return citations
+        return [
+            Citation(
+                prefix=match.group("prefix") or "",
+                key=sys.intern(match.group("key")),
+                suffix=match.group("suffix") or "",
+            )
+            for match in CITATION_PART_REGEX.finditer(markdown)
+            if match.group("email") is None
+        ]
 
 
-@dataclass
+@dataclass(frozen=True)
 class CitationBlock:
     citations: List[Citation]
     raw: str = ""
 
     def __str__(self) -> str:
-        """String representation of the citation block"""
+        return self._str
+
+    @cached_property
+    def _str(self) -> str:
+        """String representation of the citation block, built once as blocks are immutable"""
         if self.raw != "":
             return f"[{self.raw}]"
         return "[" + "; ".join(str(citation) for citation in self.citations) + "]"
@@ -72,7 +84,7 @@ class CitationBlock:
                 if len(citations) > 0:
                     citation_blocks.append(CitationBlock(raw=match.group(1), citations=citations))
             except Exception as e:
-                print(f"Error extracting citations from block: {e}")
+                log.warning(f"Error extracting citations from block: {e}")
         return citation_blocks
 
 
@@ -87,7 +99,9 @@ class InlineReference:
     def from_markdown(cls, markdown: str) -> List["InlineReference"]:
         """Finds inline references in the markdown text. Only use this after processing all regular citations"""
         inline_references = [
-            InlineReference(key=match.group("key")) for match in INLINE_REFERENCE_REGEX.finditer(markdown) if match
+            InlineReference(key=sys.intern(match.group("key")))
+            for match in INLINE_REFERENCE_REGEX.finditer(markdown)
+            if match
         ]
 
         return inline_references
@@ -16,12 +16,15 @@ class BibTexConfig(base.Config):
         full_bib_command (string): command to place a full bibliography of all references
         csl_file (string, optional): path or url to a CSL file, relative to mkdocs.yml.
         footnote_format (string): format for the footnote number, defaults to "{number}"
+        cache_dir (string, optional): directory to cache parsed bibtex files and pandoc
+                                      output in, nothing is written to disk when unset
     """
 
     # Input files
     bib_file = config_options.Optional(config_options.Type(str))
     bib_dir = config_options.Optional(config_options.Dir(exists=True))
     csl_file = config_options.Optional(config_options.Type(str))
+    cache_dir = config_options.Optional(config_options.Dir(exists=False))
 
     # Commands
     bib_command = config_options.Type(str, default="\\bibliography")
@@ -1,11 +1,17 @@
+import os
 import time
-import validators
-from collections import OrderedDict
 from pathlib import Path
 
 from mkdocs.plugins import BasePlugin
-
-from mkdocs_bibtex.citation import CitationBlock, Citation, InlineReference
+from mkdocs.utils.meta import get_data
+
+from mkdocs_bibtex.citation import (
+    CITATION_BLOCK_REGEX,
+    REFERENCE_KEY_REGEX,
+    CitationBlock,
+    Citation,
+    InlineReference,
+)
 
 from mkdocs_bibtex.config import BibTexConfig
 from mkdocs_bibtex.registry import SimpleRegistry, PandocRegistry
@@ -13,6 +19,7 @@ from mkdocs.exceptions import ConfigurationError
 
 
 from mkdocs_bibtex.utils import (
+    is_url,
     tempfile_from_url,
     log,
 )
@@ -25,9 +32,11 @@ class BibTexPlugin(BasePlugin[BibTexConfig]):
 
     def __init__(self):
         self.bib_data = None
-        self.all_references = OrderedDict()
+        self.all_references = {}
         self.last_configured = None
         self.registry = None
+        self.full_bibliography = None
+        self._parsed_pages = {}
 
     def on_startup(self, *, command, dirty):
         """Having on_startup() tells mkdocs to keep the plugin object upon rebuilds"""
@@ -42,14 +51,19 @@ class BibTexPlugin(BasePlugin[BibTexConfig]):
 
         # Set bib_file from either url or path
         if self.config.bib_file is not None:
-            is_url = validators.url(self.config.bib_file)
             # if bib_file is a valid URL, cache it with tempfile
-            if is_url:
+            if is_url(self.config.bib_file):
                 bibfiles.append(tempfile_from_url("bib file", self.config.bib_file, ".bib"))
             else:
                 bibfiles.append(self.config.bib_file)
         elif self.config.bib_dir is not None:
-            bibfiles.extend(Path(self.config.bib_dir).rglob("*.bib"))
+            # os.walk is backed by os.scandir, so file types come from the directory listing without extra stats
+            bibfiles.extend(
+                os.path.join(root, name)
+                for root, _, names in os.walk(self.config.bib_dir)
+                for name in names
+                if name.endswith(".bib")
+            )
         else:  # pragma: no cover
             raise ConfigurationError("Must supply a bibtex file or directory for bibtex files")
 
@@ -60,10 +74,11 @@ class BibTexPlugin(BasePlugin[BibTexConfig]):
                 return config
 
         # Clear references on reconfig
-        self.all_references = OrderedDict()
+        self.all_references = {}
+        self.full_bibliography = None
 
         # Set CSL from either url or path (or empty)
-        if self.config.csl_file is not None and validators.url(self.config.csl_file):
+        if self.config.csl_file is not None and is_url(self.config.csl_file):
             self.csl_file = tempfile_from_url("CSL file", self.config.csl_file, ".csl")
         else:
             self.csl_file = self.config.csl_file
@@ -73,14 +88,42 @@ class BibTexPlugin(BasePlugin[BibTexConfig]):
 
         if self.csl_file:
             self.registry = PandocRegistry(
-                bib_files=bibfiles, csl_file=self.csl_file, footnote_format=self.config.footnote_format
+                bib_files=bibfiles,
+                csl_file=self.csl_file,
+                footnote_format=self.config.footnote_format,
+                cache_dir=self.config.cache_dir,
             )
         else:
-            self.registry = SimpleRegistry(bib_files=bibfiles, footnote_format=self.config.footnote_format)
+            self.registry = SimpleRegistry(
+                bib_files=bibfiles, footnote_format=self.config.footnote_format, cache_dir=self.config.cache_dir
+            )
 
         self.last_configured = time.time()
         return config
 
+    def on_files(self, files, config):
+        """
+        Renders the citations of every page with pandoc up front, running pages in parallel
+        """
+        if not isinstance(self.registry, PandocRegistry):
+            return files
+
+        citation_block_sets = []
+        for file in files.documentation_pages():
+            if file.abs_src_path is None:
+                continue
+            try:
+                with open(file.abs_src_path, encoding="utf-8-sig") as f:
+                    # Strip the front matter like mkdocs does, so the blocks match the markdown pages are built from
+                    markdown, _ = get_data(f.read())
+            except (OSError, UnicodeDecodeError):
+                continue
+            citation_block_sets.append(CitationBlock.from_markdown(markdown))
+
+        # Pages whose citations differ by the time they're built, e.g. in front matter, just render as usual
+        self.registry.prefetch(citation_block_sets)
+        return files
+
     def on_page_markdown(self, markdown, page, config, files):
         """
         Parses the markdown for each page, extracting the bibtex references
@@ -97,38 +140,39 @@ class BibTexPlugin(BasePlugin[BibTexConfig]):
         5. Insert the full bibliograph into the markdown
         """
 
+        # 0. Skip pages without any citations or bibliography commands
+        bib_command = self.config.bib_command
+        full_bib_command = self.config.full_bib_command
+        if "@" not in markdown and bib_command not in markdown and full_bib_command not in markdown:
+            return markdown
+
         # 1. Find and validate all cite blocks in the markdown
-        cite_blocks = CitationBlock.from_markdown(markdown)
+        cite_blocks = self._from_markdown(CitationBlock, markdown, page)
         self.registry.validate_citation_blocks(cite_blocks)
 
-        # 2. Replace the cite blocks with the inline citations
-        for block in cite_blocks:
-            replacement = self.registry.inline_text(block)
-            markdown = markdown.replace(str(block), replacement)
+        # 2. Replace the cite blocks with the inline citations in a single pass
+        replacements = {str(block): self.registry.inline_text(block) for block in cite_blocks}
+        if replacements:
+            markdown = CITATION_BLOCK_REGEX.sub(lambda m: replacements.get(m.group(0), m.group(0)), markdown)
 
         # 3. Find and validate inline references
-        inline_refs = InlineReference.from_markdown(markdown)
+        inline_refs = self._from_markdown(InlineReference, markdown, page)
         inline_refs = self.registry.validate_inline_references(inline_refs)
 
         # 4a. Ensure we have a bibliography if desired
-        bib_command = self.config.bib_command
-
-        if self.config.bib_by_default and markdown.count(bib_command) == 0:
+        if self.config.bib_by_default and bib_command not in markdown:
             markdown += f"\n{bib_command}"
 
         # 4. Insert in the bibliopgrahy text into the markdown
-        citations = OrderedDict()
-        for block in cite_blocks:
-            for citation in block.citations:
-                citations[citation.key] = citation
+        # Unique citations on the page, in order of first appearance
+        citations = {citation.key: citation for block in cite_blocks for citation in block.citations}
 
         bibliography = []
         for citation in citations.values():
             try:
                 bibliography.append(
-                    "[^{}]: {}".format(
-                        self.registry.footnote_format.format(key=citation.key), self.registry.reference_text(citation)
-                    )
+                    f"[^{self.registry.footnote_format.format(key=citation.key)}]: "
+                    f"{self.registry.reference_text(citation)}"
                 )
             except Exception as e:
                 log.warning(f"Error formatting citation {citation.key}: {e}")
@@ -136,27 +180,37 @@ class BibTexPlugin(BasePlugin[BibTexConfig]):
         markdown = markdown.replace(bib_command, bibliography)
 
         # 5. Build the full Bibliography and insert into the text
-        full_bib_command = self.config.full_bib_command
-        if markdown.count(full_bib_command) > 0:
-            log.info("Building full bibliography")
-            all_citations = [Citation(key=key) for key in self.registry.bib_data.entries]
-            blocks = [CitationBlock(citations=[cite]) for cite in all_citations]
-            self.registry.validate_citation_blocks(blocks)
-            full_bibliography = []
-            for citation in all_citations:
-                full_bibliography.append(
-                    "[^{}]: {}".format(
-                        self.registry.footnote_format.format(key=citation.key), self.registry.reference_text(citation)
-                    )
+        if full_bib_command in markdown:
+            # The full bibliography is the same for every page, so only build it once per config
+            if self.full_bibliography is None:
+                log.info("Building full bibliography")
+                all_citations = [Citation(key=key) for key in self.registry.bib_data.entries]
+                blocks = [CitationBlock(citations=[cite]) for cite in all_citations]
+                self.registry.validate_citation_blocks(blocks)
+                self.full_bibliography = "\n".join(
+                    f"[^{self.registry.footnote_format.format(key=citation.key)}]: "
+                    f"{self.registry.reference_text(citation)}"
+                    for citation in all_citations
                 )
-            full_bibliography = "\n".join(full_bibliography)
-            markdown = markdown.replace(full_bib_command, full_bibliography)
+            markdown = markdown.replace(full_bib_command, self.full_bibliography)
 
-        # 6. Now add in any inline references
-        for ref in inline_refs:
-            replacement = self.registry.reference_text(ref)
-            markdown = markdown.replace(str(ref), replacement)
+        # 6. Now add in any inline references in a single pass
+        inline_replacements = {ref.key: self.registry.reference_text(ref) for ref in inline_refs}
+        if inline_replacements:
+            markdown = REFERENCE_KEY_REGEX.sub(lambda m: inline_replacements.get(m.group("key"), m.group(0)), markdown)
 
         log.debug(f"Markdown: \n{markdown}")
 
         return markdown
+
+    def _from_markdown(self, cls, markdown, page):
+        """
+        Extracts citations of the given type from a page, reusing the last result for the page if it's unchanged
+        """
+        if page is None:
+            return cls.from_markdown(markdown)
+
+        key = (cls, page.file.src_path)
+        if key not in self._parsed_pages or self._parsed_pages[key][0] != markdown:
+            self._parsed_pages[key] = (markdown, cls.from_markdown(markdown))
+        return self._parsed_pages[key][1]
@@ -1,30 +1,65 @@
-from typing import Union
+from typing import Optional, Union
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from mkdocs_bibtex.citation import Citation, CitationBlock, InlineReference
-from mkdocs_bibtex.utils import log
-from pybtex.database import BibliographyData, parse_file
+from mkdocs_bibtex.utils import LazyEntries, get_pandoc_version, log, pandoc_convert_text
+from pybtex.database import BibliographyData
 from pybtex.backends.markdown import Backend as MarkdownBackend
 from pybtex.style.formatting.plain import Style as PlainStyle
-import pypandoc
+import hashlib
+import json
+import os
 import tempfile
 import re
 from pathlib import Path
 
 
+# Numbered entries in pandoc's rendering of the citation list, handling multi-line citations
+PANDOC_CITATION_REGEX = re.compile(r"(\d+)\.\s+(.*?)(?=(?:\n\d+\.|$))", re.DOTALL)
+
+# Reference entries with .csl-left-margin and .csl-right-inline
+CSL_MARGIN_ENTRY_REGEX = re.compile(
+    r"::: \{#ref-(?P<key>[^\s]+) .csl-entry\}\n\[.*?\]\{\.csl-left-margin\}\[(?P<citation>.*?)\]\{\.csl-right-inline\}",
+    re.DOTALL,
+)
+
+# Simple reference entries
+CSL_ENTRY_REGEX = re.compile(r"::: \{#ref-(?P<key>[^\s]+) .csl-entry\}\n(?P<citation>.*?)(?=:::|$)", re.DOTALL)
+
+# Pandoc output for each set of citation blocks, keyed on a fingerprint of the bibliography and CSL
+# so it survives the registry being rebuilt on reconfig. Only the most recent fingerprints are kept
+_PANDOC_CACHE: dict[str, dict[tuple[str, ...], tuple[dict, dict]]] = {}
+_PANDOC_CACHE_SIZE = 4
+
+# Concurrent pandoc runs when prefetching, as each one loads the whole bibliography
+_PANDOC_WORKERS = 4
+
+
 class ReferenceRegistry(ABC):
     """
     A registry of references that can be used to format citations
     """
 
-    def __init__(self, bib_files: list[str], footnote_format: str = "{key}"):
-        refs = {}
+    def __init__(self, bib_files: list[str], footnote_format: str = "{key}", cache_dir: Optional[str] = None):
         log.info(f"Loading data from bib files: {bib_files}")
-        for bibfile in bib_files:
-            log.debug(f"Parsing bibtex file {bibfile}")
-            bibdata = parse_file(bibfile)
-            refs.update(bibdata.entries)
-        self.bib_data = BibliographyData(entries=refs)
+        # Keyed on lower case keys for fast case-insensitive lookups, bypassing the pure python
+        # OrderedCaseInsensitiveDict on the hot path. Entries are only parsed once they're cited
+        self._entries = LazyEntries(bib_files, cache_dir)
         self.footnote_format = footnote_format
+        self.cache_dir = cache_dir
+
+    @cached_property
+    def bib_data(self) -> BibliographyData:
+        """Every entry in the bib files, parsed the first time they're all needed"""
+        return self._entries.load_all()
+
+    def _warn_unknown_keys(self, citation_blocks: list[CitationBlock]) -> None:
+        """Warns once for every unknown key cited in the citation blocks"""
+        keys = dict.fromkeys(citation.key for block in citation_blocks for citation in block.citations)
+        for key in keys:
+            if key.lower() not in self._entries:
+                log.warning(f"Citing unknown reference key {key}")
 
     @abstractmethod
     def validate_citation_blocks(self, citation_blocks: list[CitationBlock]) -> None:
@@ -44,17 +79,17 @@ class ReferenceRegistry(ABC):
 
 
 class SimpleRegistry(ReferenceRegistry):
-    def __init__(self, bib_files: list[str], footnote_format: str = "{key}"):
-        super().__init__(bib_files, footnote_format)
+    def __init__(self, bib_files: list[str], footnote_format: str = "{key}", cache_dir: Optional[str] = None):
+        super().__init__(bib_files, footnote_format, cache_dir)
         self.style = PlainStyle()
         self.backend = MarkdownBackend()
 
+        # Cache for formatted references, as an entry always renders the same way
+        self._reference_cache: dict[str, str] = {}
+
     def validate_citation_blocks(self, citation_blocks: list[CitationBlock]) -> None:
         """Validates all citation blocks. Throws an error if any citation block is invalid"""
-        for citation_block in citation_blocks:
-            for citation in citation_block.citations:
-                if citation.key not in self.bib_data.entries:
-                    log.warning(f"Citing unknown reference key {citation.key}")
+        self._warn_unknown_keys(citation_blocks)
 
         for citation_block in citation_blocks:
             for citation in citation_block.citations:
@@ -62,25 +97,26 @@ class SimpleRegistry(ReferenceRegistry):
                     log.warning(f"Affixes not supported in simple mode: {citation}")
 
     def validate_inline_references(self, inline_references: list[InlineReference]) -> list[InlineReference]:
-        valid_refs = [ref for ref in inline_references if ref.key in self.bib_data.entries]
-        invalid_refs = [ref for ref in inline_references if ref not in valid_refs]
-
-        if len(invalid_refs) > 0:
-            for ref in invalid_refs:
-                log.warning(f"Inline reference to unknown key {ref.key}")
+        # Warn once for every unknown key, however often it is referenced
+        unknown_keys = dict.fromkeys(ref.key for ref in inline_references if ref.key.lower() not in self._entries)
+        for key in unknown_keys:
+            log.warning(f"Inline reference to unknown key {key}")
 
-        return valid_refs
+        return [ref for ref in inline_references if ref.key not in unknown_keys]
 
     def inline_text(self, citation_block: CitationBlock) -> str:
         keys = [
             self.footnote_format.format(key=citation.key)
             for citation in citation_block.citations
-            if citation.key in self.bib_data.entries
+            if citation.key.lower() in self._entries
         ]
         return "".join(f"[^{key}]" for key in keys)
 
     def reference_text(self, citation: Union[Citation, InlineReference]) -> str:
-        entry = self.bib_data.entries[citation.key]
+        if citation.key in self._reference_cache:
+            return self._reference_cache[citation.key]
+
+        entry = self._entries[citation.key.lower()]
         log.debug(f"Converting bibtex entry {citation.key!r} without pandoc")
         formatted_entry = self.style.format_entry("", entry)
         entry_text = formatted_entry.text.render(self.backend)
@@ -88,19 +124,21 @@ class SimpleRegistry(ReferenceRegistry):
         # Clean up some common escape sequences
         entry_text = entry_text.replace("\\(", "(").replace("\\)", ")").replace("\\.", ".")
         log.debug(f"SUCCESS Converting bibtex entry {citation.key!r} without pandoc")
+        self._reference_cache[citation.key] = entry_text
         return entry_text
 
 
 class PandocRegistry(ReferenceRegistry):
     """A registry that uses Pandoc to format citations"""
 
-    def __init__(self, bib_files: list[str], csl_file: str, footnote_format: str = "{key}"):
-        super().__init__(bib_files, footnote_format)
+    def __init__(
+        self, bib_files: list[str], csl_file: str, footnote_format: str = "{key}", cache_dir: Optional[str] = None
+    ):
+        super().__init__(bib_files, footnote_format, cache_dir)
         self.csl_file = csl_file
 
         # Get pandoc version for formatting decisions
-        pandoc_version = tuple(int(ver) for ver in pypandoc.get_pandoc_version().split("."))
-        if not pandoc_version >= (2, 11):
+        if not get_pandoc_version() >= (2, 11):
             raise ValueError("Pandoc version 2.11 or higher is required for this registry")
 
         # Cache for formatted citations
@@ -108,6 +146,9 @@ class PandocRegistry(ReferenceRegistry):
         self._reference_cache: dict[str, str] = {}
         self._is_inline = self._check_csl_type(self.csl_file)
 
+        # Temporary directory holding the bibliography for pandoc, cleaned up with the registry
+        self._bib_tempdir: Optional[tempfile.TemporaryDirectory] = None
+
     def inline_text(self, citation_block: CitationBlock) -> str:
         """Get the inline text for a citation block"""
         footnotes = " ".join(
@@ -131,38 +172,158 @@ class PandocRegistry(ReferenceRegistry):
     def validate_citation_blocks(self, citation_blocks: list[CitationBlock]) -> None:
         """Validates citation blocks and pre-formats all citations"""
         # First validate all keys exist
-        for citation_block in citation_blocks:
-            for citation in citation_block.citations:
-                if citation.key not in self.bib_data.entries:
-                    log.warning(f"Citing unknown reference key {citation.key}")
+        self._warn_unknown_keys(citation_blocks)
 
         # Pre-Process with appropriate pandoc version
-        self._inline_cache, self._reference_cache = self._process_with_pandoc(citation_blocks)
+        inline_cache, reference_cache = self._cached_process_with_pandoc(citation_blocks)
+        self._inline_cache, self._reference_cache = dict(inline_cache), dict(reference_cache)
 
     def validate_inline_references(self, inline_references: list[InlineReference]) -> list[InlineReference]:
-        valid_references = []
-
-        for ref in inline_references:
-            if ref.key not in self.bib_data.entries:
-                log.warning(f"Citing unknown reference key {ref.key}")
-            else:
-                valid_references.append(ref)
-
-        _, _references = self._process_with_pandoc(
-            [CitationBlock(citations=[Citation(key=ref.key)]) for ref in valid_references]
-        )
+        # Warn once for every unknown key, however often it is referenced
+        unknown_keys = dict.fromkeys(ref.key for ref in inline_references if ref.key.lower() not in self._entries)
+        for key in unknown_keys:
+            log.warning(f"Citing unknown reference key {key}")
+        valid_references = [ref for ref in inline_references if ref.key not in unknown_keys]
+
+        # Only render keys that weren't already formatted alongside the citation blocks,
+        # batching them into a single pandoc run
+        missing_keys = list(dict.fromkeys(ref.key for ref in valid_references if ref.key not in self._reference_cache))
+        if missing_keys:
+            _, _references = self._cached_process_with_pandoc(
+                [CitationBlock(citations=[Citation(key=key)]) for key in missing_keys]
+            )
+            self._reference_cache.update(_references)
 
-        self._reference_cache.update(_references)
         return valid_references
 
-    @property
+    @cached_property
     def bib_data_bibtex(self) -> str:
-        """Convert bibliography data to BibTeX format"""
+        """Convert bibliography data to BibTeX format, only once it's first needed"""
         return self.bib_data.to_string("bibtex")
 
+    @property
+    def _bib_path(self) -> str:
+        """Path to a temporary BibTeX file for pandoc, written once and reused for every call"""
+        return self._prepare_bibliography()
+
+    def _prepare_bibliography(self) -> str:
+        """Write the bibliography for pandoc if it hasn't been yet, returning its path"""
+        if self._bib_tempdir is None:
+            self._bib_tempdir = tempfile.TemporaryDirectory()
+            with open(Path(self._bib_tempdir.name, "temp.bib"), "wt", encoding="utf-8") as bibfile:
+                bibfile.write(self.bib_data_bibtex)
+        return str(Path(self._bib_tempdir.name, "temp.bib"))
+
+    @cached_property
+    def _fingerprint(self) -> str:
+        """Hash of the bibliography and CSL file contents that determine pandoc's output"""
+        digest = hashlib.md5()
+        for path in (self._bib_path, self.csl_file):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    @cached_property
+    def _pandoc_cache(self) -> dict[tuple[str, ...], tuple[dict, dict]]:
+        """Cache of pandoc output for each set of citation blocks already processed
+
+        Disambiguation (e.g. 2019a/2019b) depends on every citation in the set,
+        so results can only be reused for an identical set of blocks
+        """
+        if self._fingerprint not in _PANDOC_CACHE:
+            while len(_PANDOC_CACHE) >= _PANDOC_CACHE_SIZE:
+                del _PANDOC_CACHE[next(iter(_PANDOC_CACHE))]
+            _PANDOC_CACHE[self._fingerprint] = {}
+        return _PANDOC_CACHE[self._fingerprint]
+
+    @cached_property
+    def _stored_pandoc_cache_file(self) -> Optional[str]:
+        """File in cache_dir holding pandoc output for this bibliography, CSL and pandoc version"""
+        if self.cache_dir is None:
+            return None
+        version = ".".join(str(part) for part in get_pandoc_version())
+        digest = hashlib.sha1(json.dumps([self._fingerprint, version]).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"mkdocs_bibtex_pandoc_{digest}.json")
+
+    @cached_property
+    def _stored_pandoc_cache(self) -> dict[tuple[str, ...], tuple[dict, dict]]:
+        """Pandoc output for each set of citation blocks stored in cache_dir by an earlier build"""
+        cache_file = self._stored_pandoc_cache_file
+        if cache_file is None or not os.path.exists(cache_file):
+            return {}
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                stored = {
+                    tuple(key): (inline_cache, reference_cache) for key, inline_cache, reference_cache in json.load(f)
+                }
+            log.debug(f"Loaded cached pandoc output from {cache_file}")
+            return stored
+        except Exception as e:
+            log.debug(f"Failed to load cached pandoc output from {cache_file}: {e}")
+            return {}
+
+    def _store_pandoc_cache(self) -> None:
+        """Write the pandoc output rendered for this bibliography to cache_dir, replacing any older output
+
+        Only the sets of citation blocks seen in this process are kept, and output for other bibliographies,
+        CSL files or pandoc versions is deleted, so the cache doesn't grow with every edit
+        """
+        cache_file = self._stored_pandoc_cache_file
+        if self.cache_dir is None or cache_file is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump([[list(key), *output] for key, output in self._pandoc_cache.items() if key], f)
+            for path in Path(self.cache_dir).glob("mkdocs_bibtex_pandoc_*.json"):
+                if str(path) != cache_file:
+                    path.unlink()
+        except Exception as e:
+            log.debug(f"Failed to cache pandoc output to {cache_file}: {e}")
+
+    def prefetch(self, citation_block_sets: list[list[CitationBlock]]) -> None:
+        """Render sets of citation blocks with concurrent pandoc runs, ahead of the pages that cite them"""
+        pending = {}
+        for citation_blocks in citation_block_sets:
+            key = tuple(str(block) for block in citation_blocks)
+            if len(citation_blocks) == 0 or key in self._pandoc_cache:
+                continue
+            if key in self._stored_pandoc_cache:
+                self._pandoc_cache[key] = self._stored_pandoc_cache[key]
+            else:
+                pending[key] = citation_blocks
+
+        if not pending:
+            return
+
+        # Write the bibliography before the threads need it, so they don't race to write it
+        self._prepare_bibliography()
+        log.info(f"Rendering citations for {len(pending)} pages with pandoc")
+        # Each pandoc run is its own process, so threads are enough to run them in parallel
+        with ThreadPoolExecutor(max_workers=min(_PANDOC_WORKERS, os.cpu_count() or 1)) as executor:
+            for key, output in zip(pending, executor.map(self._process_with_pandoc, pending.values())):
+                self._pandoc_cache[key] = output
+        self._store_pandoc_cache()
+
+    def _cached_process_with_pandoc(self, citation_blocks: list[CitationBlock]) -> tuple[dict, dict]:
+        """Process citations with pandoc, reusing the output for a previously seen set of blocks"""
+        key = tuple(str(block) for block in citation_blocks)
+        if key not in self._pandoc_cache:
+            if key in self._stored_pandoc_cache:
+                self._pandoc_cache[key] = self._stored_pandoc_cache[key]
+            else:
+                self._pandoc_cache[key] = self._process_with_pandoc(citation_blocks)
+                if len(citation_blocks) > 0:
+                    self._store_pandoc_cache()
+        return self._pandoc_cache[key]
+
     def _process_with_pandoc(self, citation_blocks: list[CitationBlock]) -> tuple[dict, dict]:
         """Process citations with pandoc"""
 
+        # Nothing to cite, so don't bother spawning pandoc
+        if len(citation_blocks) == 0:
+            return {}, {}
+
         # Build the document pandoc can process and we can parse to extract inline citations and reference text
         full_doc = """
 ---
@@ -175,55 +336,39 @@ link-citations: false
         full_doc += "\n\n# References\n\n"
         log.debug("Converting with pandoc:")
         log.debug(full_doc)
-        with tempfile.TemporaryDirectory() as tmpdir:
-            bib_path = Path(tmpdir).joinpath("temp.bib")
-            with open(bib_path, "wt", encoding="utf-8") as bibfile:
-                bibfile.write(self.bib_data_bibtex)
-
-            args = ["--citeproc", "--bibliography", str(bib_path), "--csl", self.csl_file]
-            markdown = pypandoc.convert_text(
-                source=full_doc, to="markdown-citations", format="markdown", extra_args=args
-            )
+        args = ["--citeproc", "--bibliography", self._bib_path, "--csl", self.csl_file]
+        markdown = pandoc_convert_text(source=full_doc, to="markdown-citations", format="markdown", extra_args=args)
 
         log.debug("Pandoc output:")
         log.debug(markdown)
-        try:
-            splits = markdown.split("# References")
-            inline_citations, references = splits[0], splits[1]
-        except IndexError:
+        inline_citations, separator, references = markdown.partition("# References")
+        if not separator:
             raise ValueError("Failed to parse pandoc output")
 
         # Parse inline citations
         inline_citations = inline_citations.strip()
 
         # Use regex to match numbered entries, handling multi-line citations
-        citation_pattern = re.compile(r"(\d+)\.\s+(.*?)(?=(?:\n\d+\.|$))", re.DOTALL)
-        matches = citation_pattern.finditer(inline_citations)
+        matches = PANDOC_CITATION_REGEX.finditer(inline_citations)
 
         # Create a dictionary of cleaned citations (removing extra whitespace and newlines)
-        inline_citations = {int(match.group(1)): " ".join(match.group(2).split()) for match in matches}
+        numbered_citations = {int(match.group(1)): " ".join(match.group(2).split()) for match in matches}
 
-        inline_cache = {str(citation_map[index]): citation for index, citation in inline_citations.items()}
+        inline_cache = {str(citation_map[index]): citation for index, citation in numbered_citations.items()}
 
         # Parse references
         reference_cache = {}
 
-        # Pattern for format with .csl-left-margin and .csl-right-inline
-        pattern1 = r"::: \{#ref-(?P<key>[^\s]+) .csl-entry\}\n\[.*?\]\{\.csl-left-margin\}\[(?P<citation>.*?)\]\{\.csl-right-inline\}"  # noqa: E501
-
-        # Pattern for simple reference format
-        pattern2 = r"::: \{#ref-(?P<key>[^\s]+) .csl-entry\}\n(?P<citation>.*?)(?=:::|$)"
-
-        # Try first pattern
-        matches1 = re.finditer(pattern1, references, re.DOTALL)
+        # Try the format with .csl-left-margin and .csl-right-inline first
+        matches1 = CSL_MARGIN_ENTRY_REGEX.finditer(references)
         for match in matches1:
             key = match.group("key").strip()
             citation = match.group("citation").replace("\n", " ").strip()
             reference_cache[key] = citation
 
-        # If no matches found, try second pattern
+        # If no matches found, try the simple reference format
         if not reference_cache:
-            matches2 = re.finditer(pattern2, references, re.DOTALL)
+            matches2 = CSL_ENTRY_REGEX.finditer(references)
             for match in matches2:
                 key = match.group("key").strip()
                 citation = match.group("citation").replace("\n", " ").strip()
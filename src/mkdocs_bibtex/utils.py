@@ -1,15 +1,59 @@
+import functools
+import hashlib
 import logging
-import requests
+import os
+import pickle
+import re
+import subprocess
+import sys
 import tempfile
 import urllib.parse
+from collections.abc import Mapping
+from itertools import repeat
+from typing import Iterator, Optional, Sequence
+
+import pybtex
+from pybtex.database import BibliographyData, Entry, parse_file
+from pybtex.database.input.bibtex import Parser
+from pybtex.exceptions import PybtexError
 
 
 # Grab a logger
 log = logging.getLogger("mkdocs.plugins.mkdocs-bibtex")
 
+# Start of a bibtex command, e.g. "@article{" or "@string{"
+BIBTEX_COMMAND_REGEX = re.compile(r"@\s*(?P<command>\w+)\s*(?P<open>[{(])")
+
+# Braces delimiting bibtex entries and field values
+BIBTEX_BRACE_REGEX = re.compile(r"[{}]")
+
+# Level tag at the start of a pandoc message, e.g. "[WARNING] Citeproc: citation missing not found"
+PANDOC_LOG_REGEX = re.compile(r"\[(?P<level>[A-Z]+)\]\s*(?P<message>.*)")
+PANDOC_LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
+# Parsed bibtex data by file path, along with the hash of the contents it was parsed from.
+# Only the most recently parsed files are kept, as downloaded bib files get a new path every build
+_BIB_CACHE: dict[str, tuple[str, BibliographyData]] = {}
+_BIB_CACHE_SIZE = 32
+
+
+def is_url(value: str) -> bool:
+    """Whether a file option is a URL to download rather than a local path."""
+    parsed_url = urllib.parse.urlparse(value)
+    return parsed_url.scheme in ("http", "https") and bool(parsed_url.netloc)
+
 
 def tempfile_from_url(name: str, url: str, suffix: str) -> str:
     """Download bibfile from a URL."""
+    # Only needed for remote files, so keep it out of the plugin's import time
+    import requests
+
     log.debug(f"Downloading {name} from URL {url} to temporary file...")
     if urllib.parse.urlparse(url).hostname == "api.zotero.org":
         return tempfile_from_zotero_url(name, url, suffix)
@@ -32,6 +76,8 @@ def tempfile_from_url(name: str, url: str, suffix: str) -> str:
 
 def tempfile_from_zotero_url(name: str, url: str, suffix: str) -> str:
     """Download bibfile from the Zotero API."""
+    import requests
+
     log.debug(f"Downloading {name} from Zotero at {url}")
     bib_contents = ""
 
@@ -63,6 +109,278 @@ def tempfile_from_zotero_url(name: str, url: str, suffix: str) -> str:
     return file.name
 
 
+def parse_bib_file(bibfile: str, cache_dir: Optional[str] = None) -> BibliographyData:
+    """Parse a bibtex file, reusing the result of a previous parse if the file is unchanged.
+
+    The cache is keyed on a hash of the file contents, so touching or re-checking out a file
+    doesn't invalidate it. Parsed data is kept in memory for rebuilds in the same process, and
+    pickled to disk for later builds only when a cache_dir is given.
+    """
+    digest = _file_digest(bibfile)
+    cached = _BIB_CACHE.get(bibfile)
+    if cached is None or cached[0] != digest:
+        cached = _remember_bib_file(bibfile, digest, _load_bib_file(bibfile, digest, cache_dir))
+    return cached[1]
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _remember_bib_file(bibfile: str, digest: str, bibdata: BibliographyData) -> tuple[str, BibliographyData]:
+    _BIB_CACHE.pop(bibfile, None)
+    while len(_BIB_CACHE) >= _BIB_CACHE_SIZE:
+        del _BIB_CACHE[next(iter(_BIB_CACHE))]
+    _BIB_CACHE[bibfile] = (digest, bibdata)
+    return _BIB_CACHE[bibfile]
+
+
+def _load_bib_file(bibfile: str, digest: str, cache_dir: Optional[str]) -> BibliographyData:
+    """Load the bibtex data for a file with the given content hash from the pickle cache or by parsing it."""
+    if cache_dir is None:
+        return parse_file(bibfile)
+
+    # Pickles from another pybtex version may not load into this one's classes
+    cache_file = os.path.join(cache_dir, f"mkdocs_bibtex_{digest}_{pybtex.__version__}.pkl")
+
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                bibdata = pickle.load(f)
+            log.debug(f"Loaded cached bibtex data for {bibfile} from {cache_file}")
+            return bibdata
+        except Exception as e:
+            log.debug(f"Failed to load cached bibtex data from {cache_file}: {e}")
+
+    bibdata = parse_file(bibfile)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, "wb") as f:
+            pickle.dump(bibdata, f)
+    except Exception as e:
+        log.debug(f"Failed to cache bibtex data to {cache_file}: {e}")
+
+    return bibdata
+
+
+def index_bib_file(bibfile: str) -> Optional[tuple[dict[str, tuple[int, int, str]], list[str]]]:
+    """Split a bibtex file into the source of each entry without parsing the entries.
+
+    Returns the source of each entry by key, along with how many of the file's ``@string`` macros
+    are defined before it and the number of lines before it, and the source of those macros in order.
+    Returns None if the file uses syntax the index doesn't handle and has to be parsed in full.
+    """
+    try:
+        with open(bibfile, encoding="utf-8") as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        return None
+
+    entries: dict[str, tuple[int, int, str]] = {}
+    seen_keys = set()
+    macros = []
+    position = 0
+    line = 0
+    line_position = 0
+    while (position := text.find("@", position)) != -1:
+        match = BIBTEX_COMMAND_REGEX.match(text, position)
+        if match is None:
+            return None
+        command = match.group("command").lower()
+        if command == "comment":
+            # Like bibtex, only the command itself is skipped
+            position = match.end()
+            continue
+        if match.group("open") != "{":
+            return None
+
+        end = _find_closing_brace(text, match.end() - 1)
+        if end is None:
+            return None
+        source = text[match.start() : end]
+        if command == "string":
+            macros.append(source)
+        elif command != "preamble":
+            key = text[match.end() : end - 1].split(",", 1)[0].strip()
+            # Leave reporting malformed and repeated entries to pybtex
+            if not key or key.lower() in seen_keys:
+                return None
+            line += text.count("\n", line_position, match.start())
+            line_position = match.start()
+            entries[key] = (len(macros), line, source)
+            seen_keys.add(key.lower())
+        position = end
+
+    return entries, macros
+
+
+def _find_closing_brace(text: str, start: int) -> Optional[int]:
+    """Position just past the brace closing the one at start, if it is closed"""
+    depth = 0
+    for match in BIBTEX_BRACE_REGEX.finditer(text, start):
+        depth += 1 if match.group() == "{" else -1
+        if depth == 0:
+            return match.end()
+    return None
+
+
+def load_bib_files(bib_files: list[str], cache_dir: Optional[str] = None) -> BibliographyData:
+    """Parse and merge every entry in the bib files, with later files taking precedence"""
+    digests = {bibfile: _file_digest(bibfile) for bibfile in bib_files}
+    misses = [bibfile for bibfile in digests if _BIB_CACHE.get(bibfile, ("",))[0] != digests[bibfile]]
+    if len(misses) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Parsing is pure python and CPU bound, so spread the changed files across processes
+        # and keep the results here, as anything the workers memoise is lost with them
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(_load_bib_file, misses, [digests[bibfile] for bibfile in misses], repeat(cache_dir))
+            for bibfile, bibdata in zip(misses, results):
+                _remember_bib_file(bibfile, digests[bibfile], bibdata)
+
+    refs = {}
+    for bibfile in bib_files:
+        log.debug(f"Loading bibtex file {bibfile}")
+        refs.update(parse_bib_file(bibfile, cache_dir).entries)
+    return BibliographyData(entries=refs)
+
+
+class LazyEntries(Mapping):
+    """Bibtex entries from a set of bib files keyed on lower case citation keys, parsed on first access.
+
+    Only the boundaries of each entry are found up front, so citing a handful of entries from a large
+    bibliography doesn't pay to parse all of them. Files the index can't handle are parsed in full,
+    as are the files of entries that fail to parse, so pybtex reports the error for the whole file.
+    Malformed entries that are never cited aren't reported.
+    """
+
+    def __init__(self, bib_files: list[str], cache_dir: Optional[str] = None):
+        self.bib_files = bib_files
+        self.cache_dir = cache_dir
+
+        # Citation key as written for every entry, in the order they were loaded
+        self._keys: dict[str, str] = {}
+        self._parsed: dict[str, Entry] = {}
+        # Unparsed source of each entry, along with the index of the file it came from,
+        # how many of that file's macros are defined before it and the line it starts on
+        self._sources: dict[str, tuple[int, int, int, str]] = {}
+        self._macros: list[list[str]] = []
+        self._parsers: dict[tuple[int, int], Parser] = {}
+
+        for index, bibfile in enumerate(bib_files):
+            log.debug(f"Indexing bibtex file {bibfile}")
+            bib_index = index_bib_file(bibfile)
+            if bib_index is None:
+                log.debug(f"Parsing bibtex file {bibfile}")
+                for key, entry in parse_bib_file(bibfile, cache_dir).entries.items():
+                    self._add(key, entry=entry)
+                self._macros.append([])
+            else:
+                sources, macros = bib_index
+                for key, (macro_count, line, source) in sources.items():
+                    self._add(key, source=(index, macro_count, line, source))
+                self._macros.append(macros)
+
+    def _add(self, key: str, entry: Optional[Entry] = None, source: Optional[tuple[int, int, int, str]] = None) -> None:
+        lower_key = sys.intern(key.lower())
+        self._keys[lower_key] = key
+        self._parsed.pop(lower_key, None)
+        self._sources.pop(lower_key, None)
+        if entry is not None:
+            self._parsed[lower_key] = entry
+        elif source is not None:
+            self._sources[lower_key] = source
+
+    def __getitem__(self, key: str) -> Entry:
+        if key not in self._parsed:
+            index, macro_count, line, source = self._sources[key]
+            bibfile = self.bib_files[index]
+            try:
+                # Like a full parse, an entry can only use the macros defined before it,
+                # so share a parser between the entries that follow the same macros
+                if (index, macro_count) not in self._parsers:
+                    parser = self._parsers[index, macro_count] = Parser()
+                    parser.filename = bibfile
+                    parser.parse_string("\n".join(self._macros[index][:macro_count]))
+                # Pad the entry to the line it starts on so errors point at the right line
+                bibdata = self._parsers[index, macro_count].parse_string("\n" * line + source)
+            except PybtexError:
+                # Parse the whole file so pybtex reports the error as a full parse would
+                try:
+                    bibdata = parse_bib_file(bibfile, self.cache_dir)
+                except PybtexError as e:
+                    raise PybtexError(f"{bibfile}: {e}", filename=bibfile) from e
+            # Only drop the source once it parsed, so a malformed entry raises the same error every time
+            self._parsed[key] = bibdata.entries[self._keys[key]]
+            del self._sources[key]
+        return self._parsed[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load_all(self) -> BibliographyData:
+        """Parse every entry at once, which is faster than one at a time and can reuse the parse cache"""
+        bib_data = load_bib_files(self.bib_files, self.cache_dir)
+        self._parsed = {sys.intern(key.lower()): entry for key, entry in bib_data.entries.items()}
+        self._sources = {}
+        return bib_data
+
+
+@functools.lru_cache(maxsize=None)
+def get_pandoc_version() -> tuple[int, ...]:
+    """Pandoc version as a tuple, only shelling out to pandoc the first time it's needed."""
+    # pypandoc is only needed with a CSL file, so keep it out of the plugin's import time
+    import pypandoc
+
+    return tuple(int(ver) for ver in pypandoc.get_pandoc_version().split("."))
+
+
+def pandoc_convert_text(source: str, to: str, format: str, extra_args: Sequence[str] = ()) -> str:
+    """Convert text with a single pandoc subprocess.
+
+    pypandoc.convert_text runs pandoc twice more before every conversion to list the
+    supported formats, so calling pandoc directly cuts the process startup cost to one.
+    """
+    import pypandoc
+
+    command = [pypandoc.get_pandoc_path(), f"--from={format}", f"--to={to}", *extra_args]
+    result = subprocess.run(command, input=source.encode("utf-8"), capture_output=True)
+
+    stderr = result.stderr.decode("utf-8")
+    if result.returncode != 0:
+        raise RuntimeError(f"Pandoc died with exitcode {result.returncode} during conversion: {stderr}")
+    _log_pandoc_messages(stderr)
+
+    return result.stdout.decode("utf-8")
+
+
+def _log_pandoc_messages(stderr: str) -> None:
+    """Log pandoc's messages at the level pandoc tagged them with, e.g. "[INFO]" at info.
+
+    Lines without a tag continue the previous message, and untagged output is logged as a warning.
+    """
+    messages: list[tuple[int, list[str]]] = []
+    for line in stderr.splitlines():
+        match = PANDOC_LOG_REGEX.match(line)
+        if match is not None and match.group("level") in PANDOC_LOG_LEVELS:
+            messages.append((PANDOC_LOG_LEVELS[match.group("level")], [match.group("message")]))
+        elif messages:
+            messages[-1][1].append(line)
+        elif line.strip():
+            messages.append((logging.WARNING, [line]))
+
+    for level, lines in messages:
+        log.log(level, "\n".join(lines))
+
+
 def sanitize_zotero_query(url: str) -> str:
     """Sanitize query params in the Zotero URL.
 
@@ -104,6 +104,20 @@ def test_email_exclusion():
     citations = Citation.from_markdown("user@example.com")
     assert len(citations) == 0
 
+    # Only the email is skipped when it shares a block with citations
+    citations = Citation.from_markdown("@test1;user@example.com; @test2, p. 4")
+    assert [(citation.key, citation.suffix) for citation in citations] == [("test1", ""), ("test2", "p. 4")]
+
+
+def test_citation_block_str_cached():
+    """Test blocks are immutable so their string form can be reused"""
+    block = CitationBlock([Citation("test1", "see", "p. 1"), Citation("test2")])
+    assert str(block) == "[see @test1 p. 1; @test2]"
+    assert str(block) is str(block)
+
+    with pytest.raises(AttributeError):
+        block.raw = "@test3"
+
 
 def test_complex_citation_block():
     """Test complex citation block with multiple citations"""
@@ -4,8 +4,13 @@ of the plugin rather than testing individual components.
 """
 
 import os
+import types
 import pytest
 import pypandoc
+from mkdocs.structure.files import File, Files
+from mkdocs.utils.meta import get_data
+from mkdocs_bibtex import registry as registry_module
+from mkdocs_bibtex.citation import CitationBlock, InlineReference
 from mkdocs_bibtex.plugin import BibTexPlugin
 
 module_dir = os.path.dirname(os.path.abspath(__file__))
@@ -207,3 +212,91 @@ def test_inline_references(plugin):
 
     # Ensure we didn't break the regular citations
     assert "[^test]" in result
+
+
+def test_repeated_citation_blocks(plugin):
+    """Test that every occurrence of a citation block is replaced"""
+    markdown = "First [@test], again [@test] and [@test2], then [google](www.google.com).\n\n\\bibliography"
+    result = plugin.on_page_markdown(markdown, None, None, None)
+
+    assert "[@test]" not in result
+    assert result.count("[^test]") == 3  # Two citations plus the bibliography entry
+    assert "[^test2]" in result
+    assert "[google](www.google.com)" in result
+
+
+def test_page_without_citations(plugin, monkeypatch):
+    """Test that pages without citations or bibliography commands are left untouched"""
+    plugin.config.bib_by_default = True
+
+    def fail(*args, **kwargs):
+        raise AssertionError("registry should not be used")
+
+    monkeypatch.setattr(plugin.registry, "validate_citation_blocks", fail)
+    markdown = "# Just a page\n\nWith [a link](www.google.com)."
+    assert plugin.on_page_markdown(markdown, None, None, None) == markdown
+
+
+def test_full_bib_command_cached(plugin, monkeypatch):
+    """Test that the full bibliography is only built once"""
+    markdown = "Full bibliography\n\n\\full_bibliography"
+    result = plugin.on_page_markdown(markdown, None, None, None)
+
+    def fail(blocks):
+        assert len(blocks) == 0, "full bibliography should not be rebuilt"
+
+    monkeypatch.setattr(plugin.registry, "validate_citation_blocks", fail)
+    assert plugin.on_page_markdown(markdown, None, None, None) == result
+
+
+def test_inline_references_sharing_prefix(plugin):
+    """Test that inline references whose keys share a prefix are replaced independently"""
+    markdown = "Inline @test and @test2"
+    result = plugin.on_page_markdown(markdown, None, None, None)
+
+    assert "Inline First Author and Second Author. Test title. *Testing Journal*, 2019." in result
+    assert "and First Author and Second Author. Test Title (TT). *Testing Journal (TJ)*, 2019." in result
+
+
+def test_pandoc_citations_prefetched(pandoc_plugin, tmp_path, monkeypatch):
+    """Test that citations on every page are rendered with pandoc before the pages are built"""
+    pages = {
+        "index.md": "# Home\n\nNo citations here.",
+        "one.md": "Cited [see @test, p. 7].\n\n\\bibliography",
+        "two.md": "Cited [@test; @test2, chap. 2].\n\n\\bibliography",
+        "three.md": "---\nsummary: Compares [@test2]\n---\nCited [@test].\n\n\\bibliography",
+    }
+    for name, markdown in pages.items():
+        (tmp_path / name).write_text(markdown)
+    files = Files([File(name, str(tmp_path), str(tmp_path / "site"), False) for name in pages])
+
+    monkeypatch.setattr(registry_module, "_PANDOC_CACHE", {})
+    pandoc_plugin.on_files(files, None)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pandoc should not be called")
+
+    monkeypatch.setattr(pandoc_plugin.registry, "_process_with_pandoc", fail)
+    for name, markdown in pages.items():
+        # mkdocs hands pages over without their front matter
+        result = pandoc_plugin.on_page_markdown(get_data(markdown)[0], None, None, None)
+        if name != "index.md":
+            assert "[^test]" in result
+
+
+def test_unchanged_page_not_reparsed(plugin, monkeypatch):
+    """Test that citations are only extracted again once a page changes"""
+    page = types.SimpleNamespace(file=types.SimpleNamespace(src_path="index.md"))
+    markdown = "Cited [@test] and inline @test2\n\n\\bibliography"
+    result = plugin.on_page_markdown(markdown, page, None, None)
+
+    def fail(markdown):
+        raise AssertionError("unchanged page should not be parsed")
+
+    monkeypatch.setattr(CitationBlock, "from_markdown", fail)
+    monkeypatch.setattr(InlineReference, "from_markdown", fail)
+    assert plugin.on_page_markdown(markdown, page, None, None) == result
+
+    monkeypatch.undo()
+    changed = plugin.on_page_markdown(markdown.replace("[@test]", "[@test2]"), page, None, None)
+    assert "[^test2]" in changed and "[^test]" not in changed
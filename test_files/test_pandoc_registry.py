@@ -1,6 +1,7 @@
 import os
 import pytest
 import pypandoc
+from mkdocs_bibtex import registry as registry_module
 from mkdocs_bibtex.registry import PandocRegistry
 from mkdocs_bibtex.citation import Citation, CitationBlock, InlineReference
 
@@ -211,3 +212,92 @@ def test_validate_inline_refs(registry):
     assert len(registry.validate_inline_references([ref])) == 1
     assert len(registry.validate_inline_references([bad_ref])) == 0
     assert len(registry.validate_inline_references([ref, bad_ref])) == 1
+
+
+def test_validate_inline_refs_warns_once_per_key(registry, caplog):
+    """An unknown key referenced several times inline should only be reported once"""
+    refs = [InlineReference("bad_ref"), InlineReference("test"), InlineReference("bad_ref")]
+    assert len(registry.validate_inline_references(refs)) == 1
+    assert caplog.text.count("Citing unknown reference key bad_ref") == 1
+
+
+def test_validate_inline_refs_reuses_cache(registry, monkeypatch):
+    """Inline references already rendered with the citation blocks should not re-run pandoc"""
+    registry.validate_citation_blocks([CitationBlock([Citation("test", "", "")])])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pandoc should not be called")
+
+    monkeypatch.setattr(registry, "_process_with_pandoc", fail)
+    assert len(registry.validate_inline_references([InlineReference("test")])) == 1
+    assert "Test title" in registry.reference_text(InlineReference("test"))
+
+
+def test_pandoc_output_cached(registry, monkeypatch):
+    """Processing the same citation blocks again should reuse the pandoc output"""
+    blocks = [CitationBlock([Citation("test", "", ""), Citation("test2", "", "")])]
+    registry.validate_citation_blocks(blocks)
+    text = registry.inline_text(blocks[0])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pandoc should not be called")
+
+    monkeypatch.setattr(registry, "_process_with_pandoc", fail)
+    registry.validate_citation_blocks([CitationBlock([Citation("test", "", ""), Citation("test2", "", "")])])
+    assert registry.inline_text(blocks[0]) == text
+
+
+def test_pandoc_output_shared_between_registries(bib_file, csl, monkeypatch):
+    """A rebuilt registry with the same bibliography and CSL should reuse the pandoc output"""
+    blocks = [CitationBlock([Citation("test", "see", "p. 1")])]
+    first = PandocRegistry([bib_file], csl)
+    first.validate_citation_blocks(blocks)
+
+    second = PandocRegistry([bib_file], csl)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pandoc should not be called")
+
+    monkeypatch.setattr(second, "_process_with_pandoc", fail)
+    second.validate_citation_blocks(blocks)
+    assert second.inline_text(blocks[0]) == first.inline_text(blocks[0])
+
+
+def test_pandoc_output_cached_on_disk(bib_file, csl, tmp_path, monkeypatch):
+    """Pandoc output should be reused from cache_dir by a later build"""
+    blocks = [CitationBlock([Citation("test", "see", "p. 2")])]
+    first = PandocRegistry([bib_file], csl, cache_dir=str(tmp_path))
+    first.validate_citation_blocks(blocks)
+    assert len(list(tmp_path.glob("mkdocs_bibtex_pandoc_*.json"))) == 1
+
+    # Simulate a fresh process without the in-memory cache
+    monkeypatch.setattr(registry_module, "_PANDOC_CACHE", {})
+    second = PandocRegistry([bib_file], csl, cache_dir=str(tmp_path))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pandoc should not be called")
+
+    monkeypatch.setattr(second, "_process_with_pandoc", fail)
+    second.validate_citation_blocks(blocks)
+    assert second.inline_text(blocks[0]) == first.inline_text(blocks[0])
+    assert second.reference_text(Citation("test")) == first.reference_text(Citation("test"))
+
+
+def test_pandoc_output_cache_replaced_on_disk(bib_file, csl, tmp_path):
+    """Output for an older bibliography should be removed rather than left behind in cache_dir"""
+    cache_dir = tmp_path / "cache"
+    changed_bib = tmp_path / "test.bib"
+    with open(bib_file, encoding="utf-8") as f:
+        changed_bib.write_text(f.read())
+
+    first = PandocRegistry([str(changed_bib)], csl, cache_dir=str(cache_dir))
+    first.validate_citation_blocks([CitationBlock([Citation("test")])])
+    first.validate_citation_blocks([CitationBlock([Citation("test2")])])
+    assert len(list(cache_dir.glob("mkdocs_bibtex_pandoc_*.json"))) == 1
+
+    with open(changed_bib, "a", encoding="utf-8") as f:
+        f.write("\n@misc{extra, title={Extra}}\n")
+    second = PandocRegistry([str(changed_bib)], csl, cache_dir=str(cache_dir))
+    second.validate_citation_blocks([CitationBlock([Citation("test")])])
+    cache_files = list(cache_dir.glob("mkdocs_bibtex_pandoc_*.json"))
+    assert [str(path) for path in cache_files] == [second._stored_pandoc_cache_file]
@@ -40,6 +40,13 @@ def test_validate_citation_blocks_invalid_key(simple_registry):
         simple_registry.validate_citation_blocks([block])
 
 
+def test_validate_citation_blocks_warns_once_per_key(simple_registry, caplog):
+    """Test an unknown key cited several times is only reported once"""
+    blocks = [CitationBlock([Citation("nonexistent"), Citation("test")]), CitationBlock([Citation("nonexistent")])]
+    simple_registry.validate_citation_blocks(blocks)
+    assert caplog.text.count("Citing unknown reference key nonexistent") == 1
+
+
 @pytest.mark.xfail(reason="For some reason pytest does not catch the warning")
 def test_validate_citation_blocks_invalid_affixes(simple_registry):
     """Test validation fails with affixes (not supported in simple mode)"""
@@ -108,3 +115,11 @@ def test_validate_inline_refs(simple_registry):
     assert len(simple_registry.validate_inline_references([ref])) == 1
     assert len(simple_registry.validate_inline_references([bad_ref])) == 0
     assert len(simple_registry.validate_inline_references([ref, bad_ref])) == 1
+
+
+def test_reference_text_cached(simple_registry):
+    """Test that formatted references are cached per key"""
+    citation = Citation("test", "", "")
+    text = simple_registry.reference_text(citation)
+    assert simple_registry._reference_cache["test"] == text
+    assert simple_registry.reference_text(InlineReference("test")) is text
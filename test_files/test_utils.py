@@ -1,13 +1,32 @@
 import pytest
 
-from mkdocs_bibtex.utils import sanitize_zotero_query, tempfile_from_zotero_url
+from mkdocs_bibtex import utils
+from mkdocs_bibtex.utils import (
+    LazyEntries,
+    index_bib_file,
+    is_url,
+    load_bib_files,
+    pandoc_convert_text,
+    parse_bib_file,
+    sanitize_zotero_query,
+    tempfile_from_zotero_url,
+)
 import collections.abc
+import logging
 import os
 import random
+import shutil
 import string
+import tempfile
 
 import responses
 from pybtex.database import parse_file
+from pybtex.database.input.bibtex import UndefinedMacro
+from pybtex.exceptions import PybtexError
+from pybtex.scanner import TokenRequired
+
+module_dir = os.path.dirname(os.path.abspath(__file__))
+test_files_dir = os.path.abspath(os.path.join(module_dir, "..", "test_files"))
 
 EXAMPLE_ZOTERO_API_ENDPOINT = "https://api.zotero.org/groups/FOO/collections/BAR/items"
 
@@ -78,6 +97,141 @@ def test_bibtex_loading_zotero(mock_zotero_api: responses.RequestsMock, number_o
     assert len(bibdata.entries) == number_of_entries
 
 
+def test_parse_bib_file_cache(tmp_path) -> None:
+    bib_file = tmp_path / "test.bib"
+    shutil.copy(os.path.join(test_files_dir, "test.bib"), bib_file)
+    cache_dir = tmp_path / "cache"
+
+    bibdata = parse_bib_file(str(bib_file), str(cache_dir))
+    assert len(bibdata.entries) == 4
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+    # Second parse should come from the cache
+    cached = parse_bib_file(str(bib_file), str(cache_dir))
+    assert list(cached.entries) == list(bibdata.entries)
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+    # Touching the file keeps the cache, changing its contents invalidates it
+    os.utime(bib_file, ns=(0, os.stat(bib_file).st_mtime_ns + 1_000_000_000))
+    assert len(parse_bib_file(str(bib_file), str(cache_dir)).entries) == 4
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+    with open(bib_file, "a") as f:
+        f.write("\n@misc{extra, title={Extra}}\n")
+    assert len(parse_bib_file(str(bib_file), str(cache_dir)).entries) == 5
+    assert len(list(cache_dir.glob("*.pkl"))) == 2
+
+
+def test_load_bib_files_memoised(tmp_path, monkeypatch) -> None:
+    """Unchanged files should be reused from this process rather than parsed again in a worker"""
+    bib_files = []
+    for name in ("first", "second"):
+        bib_file = tmp_path / f"{name}.bib"
+        bib_file.write_text(f"@misc{{{name}, title={{{name}}}}}\n")
+        bib_files.append(str(bib_file))
+
+    assert list(load_bib_files(bib_files).entries) == ["first", "second"]
+
+    def fail(*args):
+        raise AssertionError("bib file parsed again")
+
+    monkeypatch.setattr(utils, "_load_bib_file", fail)
+    assert list(load_bib_files(bib_files).entries) == ["first", "second"]
+
+
+def test_parse_bib_file_without_cache_dir(tmp_path, monkeypatch) -> None:
+    """Without a cache_dir nothing should be written, not even to the temporary directory"""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    bib_file = os.path.join(test_files_dir, "test.bib")
+
+    assert len(parse_bib_file(bib_file).entries) == 4
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    (
+        ("https://api.zotero.org/groups/FOO/items?format=bibtex", True),
+        ("http://localhost:8000/refs.bib", True),
+        ("refs/test.bib", False),
+        ("C:\\refs\\test.bib", False),
+        ("file:///refs/test.bib", False),
+    ),
+)
+def test_is_url(value: str, expected: bool) -> None:
+    assert is_url(value) is expected
+
+
+def test_lazy_entries(tmp_path) -> None:
+    bib_file = os.path.join(test_files_dir, "test.bib")
+    bibdata = parse_file(bib_file)
+
+    entries = LazyEntries([bib_file])
+    assert list(entries) == [key.lower() for key in bibdata.entries]
+    assert "test" in entries and "missing" not in entries
+
+    # Entries are only parsed once accessed
+    assert len(entries._parsed) == 0
+    assert entries["test"] == bibdata.entries["test"]
+    assert list(entries._parsed) == ["test"]
+
+    assert entries.load_all().entries == bibdata.entries
+    assert len(entries._parsed) == len(bibdata.entries)
+
+    # Entries share the macros defined in their file
+    macro_file = tmp_path / "macros.bib"
+    macro_file.write_text('@string{jn = "Journal"}\n@comment{note}\n@article{Macro, title={A {Title}}, journal=jn}\n')
+    assert LazyEntries([str(macro_file)])["macro"].fields["journal"] == "Journal"
+
+    # Like a full parse, an entry can't use a macro defined after it
+    late_file = tmp_path / "late.bib"
+    late_file.write_text("@article{early, journal=jn}\n@string{jn = {Journal}}\n@article{late, journal=jn}\n")
+    with pytest.raises(UndefinedMacro):
+        parse_file(str(late_file))
+    late_entries = LazyEntries([str(late_file)])
+    with pytest.raises(PybtexError, match=r"late\.bib: undefined string in line 1: jn") as excinfo:
+        late_entries["early"]
+    assert isinstance(excinfo.value.__cause__, UndefinedMacro)
+    assert late_entries["late"].fields["journal"] == "Journal"
+
+    # A malformed entry keeps raising pybtex's error for the whole file, with the file and line it is on
+    bad_file = tmp_path / "bad.bib"
+    bad_file.write_text("@misc{ok, title={A}}\n@article{bad, title={X} author={Y}}\n")
+    bad_entries = LazyEntries([str(bad_file)])
+    for _ in range(2):
+        with pytest.raises(PybtexError, match=r"bad\.bib: syntax error in line 2") as excinfo:
+            bad_entries["bad"]
+        assert isinstance(excinfo.value.__cause__, TokenRequired)
+    assert "bad" in bad_entries
+    assert bad_entries["ok"].fields["title"] == "A"
+
+    # Files the index doesn't handle are parsed in full
+    paren_file = tmp_path / "paren.bib"
+    paren_file.write_text("@article(paren, title={Title})\n")
+    assert index_bib_file(str(paren_file)) is None
+    assert LazyEntries([str(paren_file)])["paren"].fields["title"] == "Title"
+
+
+def test_pandoc_convert_text() -> None:
+    assert pandoc_convert_text("*Hello* world", to="html", format="markdown").strip() == "<p><em>Hello</em> world</p>"
+
+    with pytest.raises(RuntimeError):
+        pandoc_convert_text("Hello", to="not-a-format", format="markdown")
+
+
+def test_log_pandoc_messages(caplog) -> None:
+    """Pandoc messages should be logged once each at their own level, without the level tag"""
+    caplog.set_level(logging.DEBUG, logger=utils.log.name)
+    utils._log_pandoc_messages(
+        "[INFO] Loaded csl\n[WARNING] Citeproc: citation missing not found\n  continued on this line\n"
+    )
+
+    assert [(record.levelno, record.getMessage()) for record in caplog.records] == [
+        (logging.INFO, "Loaded csl"),
+        (logging.WARNING, "Citeproc: citation missing not found\n  continued on this line"),
+    ]
+
+
 def generate_bibtex_entries(n: int) -> list[str]:
     """Generates n random bibtex entries."""
 